@@ -1,36 +1,106 @@
+import hmac
 import os
+import secrets
+import sqlite3
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
 from datetime import timedelta
-from enum import Enum
-from uuid import uuid4
+from enum import IntEnum
+from functools import lru_cache
+from typing import List, Optional
 
+import orjson
 from flask import Flask, request, abort, jsonify, send_from_directory
+from flask.json import JSONEncoder
+from flask_compress import Compress
 from flask_jwt_extended import JWTManager, jwt_required, create_access_token, get_jwt_identity
 from flask_migrate import Migrate
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, SmallInteger, String, Boolean, ForeignKey, Index, event, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.orm import relationship, raiseload, selectinload
 
 MENTORSHIP_REQUIRES = 1_000
+UPLOAD_CHUNK_SIZE = 1 << 20
+MAX_IN_CLAUSE_SIZE = 999
+TAGS_CACHE_TTL = 60
+
+
+class OrJSONEncoder(JSONEncoder):
+    # Drop-in for Flask's encoder: orjson does the encoding, Flask's default() still handles dates and the like
+    def encode(self, o):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if self.indent is not None:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(o, default=self.default, option=option).decode()
+
 
 app = Flask(__name__, static_folder=None)
+app.json_encoder = OrJSONEncoder
 script_path = os.path.dirname(os.path.abspath(__file__))
 default_db_path = os.path.join(script_path, 'hackathon.db')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('HACKATHON_DB_URL', f'sqlite:////{default_db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+    # Keep connections open between requests instead of SQLAlchemy's NullPool default for SQLite files
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': QueuePool,
+        'connect_args': {'check_same_thread': False},
+    }
 app.config['JWT_SECRET_KEY'] = 'secret-string'
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
 app.config['UPLOAD_FOLDER'] = os.path.join(script_path, 'uploads')
+app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024
+# Let the front web server send uploaded files itself; only enable behind a server that handles X-Sendfile
+app.config['USE_X_SENDFILE'] = os.environ.get('HACKATHON_X_SENDFILE') == '1'
+# Uploads the front web server has already written to disk, for example with nginx:
+#     location = /images {
+#         client_body_temp_path /srv/hackathon/upload_tmp;
+#         client_body_in_file_only clean;
+#         proxy_pass_request_body off;
+#         proxy_set_header Content-Length '';
+#         proxy_set_header X-File $request_body_file;
+#         proxy_set_header X-Upload-Secret <HACKATHON_UPLOAD_PROXY_SECRET>;
+#         proxy_pass http://127.0.0.1:8000;
+#     }
+# Every POST body then arrives as X-File, so clients behind it send the raw image bytes. The temp folder must be on
+# the same filesystem as UPLOAD_FOLDER so uploads can be moved with a rename.
+app.config['UPLOAD_TEMP_FOLDER'] = os.environ.get('HACKATHON_UPLOAD_TEMP_FOLDER')
+app.config['UPLOAD_PROXY_SECRET'] = os.environ.get('HACKATHON_UPLOAD_PROXY_SECRET')
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+app.config['COMPRESS_ALGORITHM'] = ['br', 'zstd', 'gzip']
+app.config['COMPRESS_BR_LEVEL'] = 4
+app.config['COMPRESS_MIN_SIZE'] = 500
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+migrate = Migrate(app, db, render_as_batch=True)
 jwt = JWTManager(app)
+Compress(app)
+
 
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA mmap_size=268435456')
+    cursor.execute('PRAGMA cache_size=-65536')
+    cursor.close()
 
-class MentorshipState(Enum):
-    not_enough_points = 'not_enough_points'
-    uninitialized = 'uninitialized'
-    waiting = 'waiting'
-    mentored = 'mentored'
+
+class MentorshipState(IntEnum):
+    not_enough_points = 0
+    uninitialized = 1
+    waiting = 2
+    mentored = 3
 
 
 class Kid(db.Model):
@@ -43,16 +113,22 @@ class Kid(db.Model):
     goal = Column(String(1024))
     points = Column(Integer, nullable=False, default=100)
     avatar = Column(String(512))
-    mentorship = Column(SQLEnum(MentorshipState), nullable=False, default=MentorshipState.not_enough_points)
-    tasks = relationship('Task')
+    mentorship = Column(SmallInteger, nullable=False, default=MentorshipState.not_enough_points)
+    tasks = relationship('Task', order_by='Task.order')
     interests = relationship('Tag', secondary='interests')
     likes = relationship('Mentor', secondary='likes')
 
 
+def lowered_tag_name(context):
+    return context.get_current_parameters()['name'].lower()
+
+
 class Tag(db.Model):
     __tablename__ = 'tags'
     id = Column(Integer, primary_key=True)
     name = Column(String(64), unique=True, nullable=False)
+    # Lowercased with Python's str.lower(), SQLite's lower() only folds ASCII letters
+    name_lower = Column(String(64), nullable=False, index=True, default=lowered_tag_name)
 
 
 class Mentor(db.Model):
@@ -95,6 +171,9 @@ class Task(db.Model):
     done = Column(Boolean, nullable=False, default=False)
 
 
+Index('ix_tasks_kid_order', Task.kid_id, Task.order)
+
+
 class Proposition(db.Model):
     __tablename__ = 'propositions'
     id = Column(Integer, primary_key=True)
@@ -106,14 +185,153 @@ class Proposition(db.Model):
     content = Column(String(1024), nullable=False)
 
 
+# Response schemas; orjson serializes dataclasses natively, without building intermediate dicts
+# Fields are declared in sorted order: orjson keeps dataclass field order even with OPT_SORT_KEYS,
+# so this is what keeps JSON_SORT_KEYS output consistent with plain dict responses
+@dataclass
+class TaskOut:
+    done: bool
+    id: int
+    text: str
+
+
+@dataclass
+class PropositionOut:
+    id: int
+    image: Optional[str]
+    points: int
+    title: str
+
+
+@dataclass
+class MentorOut:
+    bio: str
+    expertises: List[str]
+    id: int
+    name: str
+    photo: Optional[str]
+    position: str
+
+
+@dataclass
+class KidProfileOut:
+    account_id: str
+    avatar: Optional[str]
+    goal: Optional[str]
+    interests: List[str]
+    mentorship: str
+    name: str
+    points: int
+    tasks: List[TaskOut]
+
+
+def current_kid(*load_opts):
+    # The authenticated kid; in debug any relationship not in load_opts raises on access
+    if app.debug:
+        load_opts += (raiseload('*'),)
+    return Kid.query.options(*load_opts).get(get_jwt_identity())
+
+
+def find_tags(names):
+    tags = []
+    for start in range(0, len(names), MAX_IN_CLAUSE_SIZE):
+        tags.extend(Tag.query.filter(Tag.name.in_(names[start:start + MAX_IN_CLAUSE_SIZE])).all())
+    return tags
+
+
+def insert_skipping_duplicates(table):
+    # Each backend spells "skip rows that violate a unique constraint" differently
+    dialect_name = db.engine.dialect.name
+    if dialect_name == 'sqlite':
+        return table.insert().prefix_with('OR IGNORE')
+    if dialect_name == 'mysql':
+        return table.insert().prefix_with('IGNORE')
+    if dialect_name == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    # Other backends get a plain insert, duplicates fail the whole batch
+    return table.insert()
+
+
+def prefix_upper_bound(prefix):
+    # Smallest string above everything starting with prefix, None when no such string exists
+    prefix = prefix.rstrip(chr(sys.maxunicode))
+    if not prefix:
+        return None
+    next_code_point = ord(prefix[-1]) + 1
+    if 0xD800 <= next_code_point <= 0xDFFF:
+        # Surrogates can't be encoded for SQLite; nothing valid sorts between them and U+E000
+        next_code_point = 0xE000
+    return prefix[:-1] + chr(next_code_point)
+
+
+@lru_cache(maxsize=256)
+def cached_tag_names(tag_name_start, ttl_bucket):
+    # ttl_bucket only expires entries, so tags added through other worker processes show up within TAGS_CACHE_TTL
+    query = Tag.query.with_entities(Tag.name)
+    if tag_name_start:
+        # Range scan over ix_tags_name_lower
+        query = query.filter(Tag.name_lower >= tag_name_start)
+        tag_name_end = prefix_upper_bound(tag_name_start)
+        if tag_name_end is not None:
+            query = query.filter(Tag.name_lower < tag_name_end)
+    return tuple(name for name, in query.all())
+
+
+def select_kid_tasks(kid_id):
+    query = select([Task.id, Task.text, Task.done]).where(Task.kid_id == kid_id).order_by(Task.order)
+    return [TaskOut(**row) for row in db.session.execute(query)]
+
+
+def upload_file_name(original_name):
+    name, ext = os.path.splitext(original_name)
+    return secrets.token_urlsafe(12) + ext
+
+
+def sent_by_upload_proxy():
+    # X-File names a file on this server, so it is only trusted from the web server that knows the shared secret
+    secret = app.config['UPLOAD_PROXY_SECRET']
+    if not secret or not app.config['UPLOAD_TEMP_FOLDER']:
+        return False
+    return hmac.compare_digest(request.headers.get('X-Upload-Secret', '').encode(), secret.encode())
+
+
 @app.route('/images', methods=['GET', 'POST'])
 def upload_image():
     if request.method == 'GET':
         return send_from_directory(app.config['UPLOAD_FOLDER'], request.args['filename'])
     # POST
+    body_file = request.headers.get('X-File')
+    if body_file is not None and sent_by_upload_proxy():
+        # The web server already wrote the raw body to disk, move it into place without copying
+        body_path = os.path.realpath(body_file)
+        temp_folder = os.path.realpath(app.config['UPLOAD_TEMP_FOLDER'])
+        if os.path.commonpath([body_path, temp_folder]) != temp_folder or not os.path.isfile(body_path):
+            abort(400)
+        file_name = upload_file_name(request.args.get('filename', ''))
+        os.rename(body_path, os.path.join(app.config['UPLOAD_FOLDER'], file_name))
+        return jsonify(filename=file_name)
+    if request.mimetype == 'application/octet-stream':
+        # Raw body upload, written straight to disk without going through the multipart parser
+        if (request.content_length or 0) > app.config['MAX_CONTENT_LENGTH']:
+            abort(413)
+        file_name = upload_file_name(request.args.get('filename', ''))
+        file_path = os.path.join(app.config['UPLOAD_FOLDER'], file_name)
+        written = 0
+        try:
+            with open(file_path, 'wb') as image_file:
+                while chunk := request.stream.read(UPLOAD_CHUNK_SIZE):
+                    # Chunked bodies have no Content-Length to check up front
+                    written += len(chunk)
+                    if written > app.config['MAX_CONTENT_LENGTH']:
+                        abort(413)
+                    image_file.write(chunk)
+        except Exception:
+            # Don't leave truncated files behind on overflow or client disconnect
+            os.remove(file_path)
+            raise
+        return jsonify(filename=file_name)
     image_file = request.files['image']
-    name, ext = os.path.splitext(image_file.filename)
-    file_name = str(uuid4()) + ext
+    file_name = upload_file_name(image_file.filename)
     image_file.save(os.path.join(app.config['UPLOAD_FOLDER'], file_name))
     return jsonify(filename=file_name)
 
@@ -144,9 +362,9 @@ def login():
 def manage_tags():
     if request.method == 'GET':
         tag_name_start = request.args.get('tag', '').lower()
-        all_tags = Tag.query.all()
-        tag_names = [tag.name for tag in all_tags if tag.name.lower().startswith(tag_name_start)]
-        return jsonify(tags=tag_names)
+        response = jsonify(tags=cached_tag_names(tag_name_start, int(time.monotonic() // TAGS_CACHE_TTL)))
+        response.add_etag()
+        return response.make_conditional(request)
     # POST
     tag_name = request.json['tag']
     new_tag = Tag(name=tag_name)
@@ -155,17 +373,32 @@ def manage_tags():
         db.session.commit()
     except Exception:  # noqa
         return '', 400
+    cached_tag_names.cache_clear()
+    return '', 201
+
+
+@app.route('/tags/bulk', methods=['POST'])
+def add_tags():
+    tag_names = request.json['tags']
+    if not isinstance(tag_names, list) or not all(isinstance(tag_name, str) for tag_name in tag_names):
+        abort(400)
+    if tag_names:
+        # One transaction for the whole batch; names that already exist are skipped
+        insert_tags = insert_skipping_duplicates(Tag.__table__)
+        try:
+            db.session.execute(insert_tags, [{'name': tag_name} for tag_name in tag_names])
+            db.session.commit()
+        except Exception:  # noqa
+            return '', 400
+        cached_tag_names.cache_clear()
     return '', 201
 
 
 @app.route('/kids/interests', methods=['POST'])
 @jwt_required
 def add_interests():
-    kid = Kid.query.get(get_jwt_identity())
-    for tag_name in request.json['interests']:
-        tag = Tag.query.filter_by(name=tag_name).one_or_none()
-        if tag is not None:
-            kid.interests.append(tag)
+    kid = current_kid(selectinload(Kid.interests))
+    kid.interests.extend(find_tags(request.json['interests']))
     db.session.commit()
     return '', 200
 
@@ -175,10 +408,9 @@ def add_interests():
 def set_goal():
     goal = request.json['goal']
     kid_id = get_jwt_identity()
-    kid = Kid.query.get(kid_id)
-    kid.goal = goal
+    Kid.query.filter_by(id=kid_id).update({'goal': goal})
     if request.method == 'POST':
-        Task.query.filter_by(kid_id=kid.id).delete()
+        Task.query.filter_by(kid_id=kid_id).delete()
     db.session.commit()
     return '', 200
 
@@ -186,8 +418,7 @@ def set_goal():
 @app.route('/kids/avatar', methods=['POST'])
 @jwt_required
 def set_avatar():
-    kid = Kid.query.get(get_jwt_identity())
-    kid.avatar = request.json['avatar']
+    Kid.query.filter_by(id=get_jwt_identity()).update({'avatar': request.json['avatar']})
     db.session.commit()
     return '', 200
 
@@ -195,24 +426,18 @@ def set_avatar():
 @app.route('/kids/goal/tasks', methods=['GET', 'POST', 'PUT'])
 @jwt_required
 def manage_tasks():
-    kid = Kid.query.get(get_jwt_identity())
     if request.method == 'GET':
-        tasks = [
-            {'id': task.id, 'text': task.text, 'done': task.done} for task in sorted(kid.tasks, key=lambda t: t.order)
-        ]
-        return jsonify(tasks=tasks)
+        return jsonify(tasks=select_kid_tasks(get_jwt_identity()))
     if request.method == 'POST':
-        new_task = Task(kid_id=kid.id, **request.json)
+        new_task = Task(kid_id=get_jwt_identity(), **request.json)
         db.session.add(new_task)
         db.session.commit()
         return '', 201
     # PUT
     task_id = request.json['id']
     done = request.json['done']
-    task = Task.query.get(task_id)
-    if task is None:
+    if not Task.query.filter_by(id=task_id).update({'done': done}):
         abort(404)
-    task.done = done
     db.session.commit()
     return '', 200
 
@@ -220,15 +445,10 @@ def manage_tasks():
 @app.route('/propositions', methods=['GET', 'POST'])
 def manage_propositions():
     if request.method == 'GET':
-        all_propositions = [
-            {
-                'id': propos.id,
-                'title': propos.title,
-                'image': propos.image,
-                'points': propos.points_required,
-            }
-            for propos in Proposition.query.all()
-        ]
+        query = select(
+            [Proposition.id, Proposition.title, Proposition.image, Proposition.points_required.label('points')]
+        )
+        all_propositions = [PropositionOut(**row) for row in db.session.execute(query)]
         return jsonify(propositions=all_propositions)
     # POST
     new_propos = Proposition(**request.json)
@@ -240,7 +460,7 @@ def manage_propositions():
 @app.route('/propositions/card')
 @jwt_required
 def get_proposition_card():
-    kid = Kid.query.get(get_jwt_identity())
+    kid = current_kid()
     propos = Proposition.query.get(request.json['id'])
     proposition = {
         'title': propos.title,
@@ -257,28 +477,32 @@ def get_proposition_card():
 @app.route('/kids/profile')
 @jwt_required
 def profile():
-    kid = Kid.query.get(get_jwt_identity())
-    kid_profile = {
-        'account_id': kid.account_id,
-        'goal': kid.goal,
-        'tasks': [
-            {'id': task.id, 'text': task.text, 'done': task.done} for task in sorted(kid.tasks, key=lambda t: t.order)
-        ],
-        'interests': [interest.name for interest in kid.interests],
-        'name': kid.name,
-        'points': kid.points,
-        'avatar': kid.avatar,
-        'mentorship': kid.mentorship.name,
-    }
+    kid_id = get_jwt_identity()
+    kid_query = select([Kid.account_id, Kid.goal, Kid.name, Kid.points, Kid.avatar, Kid.mentorship])
+    kid = db.session.execute(kid_query.where(Kid.id == kid_id)).first()
+    interests_query = select([Tag.name]).where(interests.c.tag_id == Tag.id).where(interests.c.kid_id == kid_id)
+    kid_profile = KidProfileOut(
+        account_id=kid.account_id,
+        goal=kid.goal,
+        tasks=select_kid_tasks(kid_id),
+        interests=[name for name, in db.session.execute(interests_query)],
+        name=kid.name,
+        points=kid.points,
+        avatar=kid.avatar,
+        mentorship=MentorshipState(kid.mentorship).name,
+    )
     return jsonify(profile=kid_profile)
 
 
 @app.route('/kids/points/add', methods=['POST'])
 def add_points():
-    kid = Kid.query.filter_by(account_id=request.json['account_id']).one()
-    kid.points += request.json['amount']
-    if kid.points >= MENTORSHIP_REQUIRES and kid.mentorship == MentorshipState.not_enough_points:
-        kid.mentorship = MentorshipState.uninitialized
+    kid_query = Kid.query.filter_by(account_id=request.json['account_id'])
+    # Incremented in SQL so concurrent requests can't overwrite each other's totals
+    if not kid_query.update({'points': Kid.points + request.json['amount']}):
+        abort(404)
+    kid_query.filter(Kid.points >= MENTORSHIP_REQUIRES, Kid.mentorship == MentorshipState.not_enough_points).update(
+        {'mentorship': MentorshipState.uninitialized}
+    )
     db.session.commit()
     return '', 200
 
@@ -286,17 +510,12 @@ def add_points():
 @app.route('/mentors', methods=['GET', 'POST'])
 def manage_mentors():
     if request.method == 'GET':
-        mentors = [
-            {
-                'id': mentor.id,
-                'name': mentor.name,
-                'photo': mentor.photo,
-                'position': mentor.position,
-                'bio': mentor.bio,
-                'expertises': [exp.name for exp in mentor.expertises]
-            }
-            for mentor in Mentor.query.all()
-        ]
+        mentor_expertises = defaultdict(list)
+        expertises_query = select([expertises.c.mentor_id, Tag.name]).where(expertises.c.tag_id == Tag.id)
+        for mentor_id, tag_name in db.session.execute(expertises_query):
+            mentor_expertises[mentor_id].append(tag_name)
+        query = select([Mentor.id, Mentor.name, Mentor.photo, Mentor.position, Mentor.bio])
+        mentors = [MentorOut(**row, expertises=mentor_expertises[row.id]) for row in db.session.execute(query)]
         return jsonify(mentors=mentors)
     # POST
     new_mentor = Mentor(**request.json)
@@ -308,10 +527,7 @@ def manage_mentors():
 @app.route('/mentors/expertises', methods=['POST'])
 def add_expertises():
     mentor = Mentor.query.get(request.json['id'])
-    for exp in request.json['expertises']:
-        expertise = Tag.query.filter_by(name=exp).one_or_none()
-        if expertise is not None:
-            mentor.expertises.append(expertise)
+    mentor.expertises.extend(find_tags(request.json['expertises']))
     db.session.commit()
     return '', 200
 
@@ -319,7 +535,7 @@ def add_expertises():
 @app.route('/kids/mentor/like', methods=['POST'])
 @jwt_required
 def like_mentor():
-    kid = Kid.query.get(get_jwt_identity())
+    kid = current_kid(selectinload(Kid.likes))
     mentor_id = request.json['id']
     mentor = Mentor.query.get(mentor_id)
     kid.likes.append(mentor)
@@ -330,7 +546,7 @@ def like_mentor():
 @app.route('/kids/mentor/ready', methods=['POST'])
 @jwt_required
 def wait_for_mentor():
-    kid = Kid.query.get(get_jwt_identity())
+    kid = current_kid()
     kid.mentorship = MentorshipState.waiting
     db.session.commit()
     return '', 200
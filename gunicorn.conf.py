@@ -0,0 +1,7 @@
+import os
+
+# Run with: gunicorn app:app
+bind = os.environ.get('HACKATHON_BIND', '127.0.0.1:8000')
+workers = int(os.environ.get('HACKATHON_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('HACKATHON_THREADS', 8))
@@ -0,0 +1,41 @@
+"""Add tags.name_lower
+
+Revision ID: 156d5f3835bf
+Revises: d697a6d94600
+Create Date: 2026-10-15 07:29:29.946145
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '156d5f3835bf'
+down_revision = 'd697a6d94600'
+branch_labels = None
+depends_on = None
+
+
+tags = sa.table('tags', sa.column('id', sa.Integer), sa.column('name', sa.String), sa.column('name_lower', sa.String))
+
+
+def upgrade():
+    op.add_column('tags', sa.Column('name_lower', sa.String(length=64), nullable=True))
+    # Filled with Python's str.lower() to match the model default, SQLite's lower() only folds ASCII letters
+    connection = op.get_bind()
+    lowered_names = [
+        {'tag_id': tag_id, 'lowered': name.lower()}
+        for tag_id, name in connection.execute(sa.select([tags.c.id, tags.c.name]))
+    ]
+    if lowered_names:
+        set_name_lower = tags.update().where(tags.c.id == sa.bindparam('tag_id'))
+        connection.execute(set_name_lower.values(name_lower=sa.bindparam('lowered')), lowered_names)
+    with op.batch_alter_table('tags') as batch_op:
+        batch_op.alter_column('name_lower', existing_type=sa.String(length=64), nullable=False)
+        batch_op.create_index('ix_tags_name_lower', ['name_lower'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tags') as batch_op:
+        batch_op.drop_index('ix_tags_name_lower')
+        batch_op.drop_column('name_lower')
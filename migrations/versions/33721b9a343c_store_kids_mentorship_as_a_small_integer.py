@@ -0,0 +1,54 @@
+"""Store kids.mentorship as a small integer
+
+Revision ID: 33721b9a343c
+Revises: 496af4ec5a12
+Create Date: 2026-10-15 07:33:01.906256
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '33721b9a343c'
+down_revision = '496af4ec5a12'
+branch_labels = None
+depends_on = None
+
+
+# MentorshipState names in code order, frozen here so later changes to the enum don't alter this revision
+STATES = ['not_enough_points', 'uninitialized', 'waiting', 'mentored']
+kids = sa.table(
+    'kids',
+    sa.column('mentorship', sa.String),
+    sa.column('mentorship_code', sa.SmallInteger),
+    sa.column('mentorship_name', sa.String),
+)
+
+
+def upgrade():
+    op.add_column('kids', sa.Column('mentorship_code', sa.SmallInteger(), nullable=True))
+    state_codes = sa.case({name: code for code, name in enumerate(STATES)}, value=sa.cast(kids.c.mentorship, sa.String))
+    op.execute(kids.update().values(mentorship_code=state_codes))
+    with op.batch_alter_table('kids') as batch_op:
+        batch_op.drop_column('mentorship')
+        batch_op.alter_column(
+            'mentorship_code', new_column_name='mentorship', existing_type=sa.SmallInteger(), nullable=False
+        )
+    # Native enum type on PostgreSQL, a no-op elsewhere
+    sa.Enum(name='mentorshipstate').drop(op.get_bind(), checkfirst=True)
+
+
+def downgrade():
+    op.add_column('kids', sa.Column('mentorship_name', sa.String(length=17), nullable=True))
+    state_names = sa.case({code: name for code, name in enumerate(STATES)}, value=kids.c.mentorship)
+    op.execute(kids.update().values(mentorship_name=state_names))
+    with op.batch_alter_table('kids') as batch_op:
+        batch_op.drop_column('mentorship')
+        batch_op.alter_column(
+            'mentorship_name',
+            new_column_name='mentorship',
+            existing_type=sa.String(length=17),
+            type_=sa.Enum(*STATES, name='mentorshipstate'),
+            nullable=False,
+        )